@@ -0,0 +1,436 @@
+"""
+Индекс автодополнения названий и авторов книг в памяти
+
+Для каждого поля хранится отсортированный по нормализованному ключу массив
+строк и параллельный массив количеств книг, поиск префикса делается через bisect.
+Для "тяжёлых" префиксов (больше heavy_threshold ключей, например "t")
+лучшие дополнения заранее посчитаны с запасом и обновляются инкрементально.
+Когда после удалений запас кончается, список пересобирается слиянием
+списков дочерних префиксов в потоке записи, а не в запросе.
+
+Индекс у каждого воркера свой: он строится из таблицы books и догоняет БД
+по журналу изменений books_log (миграция 2), который заполняют триггеры.
+Так в него попадают и изменения, сделанные через другие воркеры.
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import heapq
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from database import Book, BookChange
+
+logger = logging.getLogger(__name__)
+
+# Индексируемые поля книги
+KINDS = ("title", "author")
+
+# Максимальное число дополнений в одном ответе
+MAX_LIMIT = 20
+
+# Длина посчитанных списков: запас на удаления до пересборки
+TOP_SIZE = 2 * MAX_LIMIT
+
+# Сколько последних записей журнала books_log хранить для отстающих воркеров
+LOG_KEEP = 100_000
+
+# Символ больше любого в ключе: prefix + END ограничивает диапазон префикса сверху
+END = "\U0010ffff"
+
+# Место дополнения в рейтинге: больше книг -> короче строка -> по алфавиту
+Rank = Tuple[int, int, str]
+
+
+class PrefixIndex:
+    """Отсортированный массив уникальных строк одного поля с количеством книг"""
+
+    def __init__(self, max_keys: int, max_key_length: int, heavy_threshold: int) -> None:
+        self.max_keys = max_keys
+        self.max_key_length = max_key_length
+        self.heavy_threshold = heavy_threshold
+        self.texts: List[str] = []           # исходные строки, по возрастанию ключа
+        self.counts = array("I")             # количество книг для texts[i]
+        self.top: Dict[str, List[Rank]] = {}  # тяжёлый префикс -> лучшие дополнения
+        self.dropped = 0                     # сколько значений не влезло в лимит ключей
+        self._string_bytes = 0
+
+    def key(self, text: str) -> str:
+        """Ключ индекса: нижний регистр, одиночные пробелы, ограниченная длина"""
+        return " ".join(text[:self.max_key_length].casefold().split())
+
+    def _rank(self, i: int) -> Rank:
+        return -self.counts[i], len(self.texts[i]), self.texts[i]
+
+    def _find(self, key: str) -> Tuple[int, bool]:
+        i = bisect_left(self.texts, key, key=self.key)
+        return i, i < len(self.texts) and self.key(self.texts[i]) == key
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect_left(self.texts, prefix, key=self.key)
+        return start, bisect_left(self.texts, prefix + END, start, key=self.key)
+
+    def _best(self, start: int, end: int) -> List[Rank]:
+        return heapq.nsmallest(TOP_SIZE, (self._rank(i) for i in range(start, end)))
+
+    def collect(self, entries: Dict[str, List], value: str) -> bool:
+        """
+        Учёт одного значения при построении: entries - ключ -> [текст, количество].
+        Возвращает False, если значение не влезло в лимит ключей
+        """
+        key = self.key(value)
+        if not key:
+            return True
+        entry = entries.get(key)
+        if entry is None:
+            if len(entries) >= self.max_keys:
+                return False
+            entry = entries[key] = [value[:self.max_key_length], 0]
+        entry[1] += 1
+        return True
+
+    def load(self, entries: Dict[str, List], dropped: int) -> None:
+        """Замена содержимого собранными collect() ключами: одна сортировка и тяжёлые префиксы"""
+        self.dropped = dropped
+        ordered = sorted(entries.items())
+        self.texts = [text for _, (text, _) in ordered]
+        self.counts = array("I", (count for _, (_, count) in ordered))
+        self._string_bytes = sum(sys.getsizeof(text) for text in self.texts)
+
+        self.top = {}
+        keys = [key for key, _ in ordered]
+        entries.clear()
+        del ordered
+        self._build_top(keys, 0, len(keys), 0)
+
+    def _build_top(self, keys: List[str], lo: int, hi: int, depth: int) -> List[Rank]:
+        """
+        Обход сжатого префиксного дерева по отсортированным ключам снизу вверх:
+        лучшие дополнения узла - слияние лучших у детей, поэтому каждый
+        лёгкий диапазон просматривается один раз
+        """
+        if hi - lo <= self.heavy_threshold:
+            return self._best(lo, hi)
+
+        candidates = []
+        i = lo
+        if len(keys[i]) == depth:  # ключ, совпадающий с самим префиксом
+            candidates.append(self._rank(i))
+            i += 1
+        while i < hi:
+            j = bisect_left(keys, keys[i][:depth + 1] + END, i, hi)
+            candidates.extend(self._build_top(keys, i, j, depth + 1))
+            i = j
+
+        best = heapq.nsmallest(TOP_SIZE, candidates)
+        if depth:
+            self.top[keys[lo][:depth]] = best
+        return best
+
+    def _refill(self, prefix: str, start: int, end: int) -> List[Rank]:
+        """
+        Пересборка списка префикса слиянием списков его дочерних префиксов.
+        Тяжёлые дети берутся из self.top (при нехватке пересобираются сами),
+        лёгкие просматриваются целиком - это не больше heavy_threshold ключей
+        """
+        depth = len(prefix)
+        candidates = []
+        # Список родителя точен на длину самого короткого обрезанного списка ребёнка
+        size = TOP_SIZE
+        i = start
+        if self.key(self.texts[i]) == prefix:
+            candidates.append(self._rank(i))
+            i += 1
+        while i < end:
+            child = self.key(self.texts[i])[:depth + 1]
+            j = bisect_left(self.texts, child + END, i, end, key=self.key)
+            if j - i <= self.heavy_threshold:
+                candidates.extend(self._best(i, j))
+            else:
+                best = self.top.get(child)
+                if best is None or len(best) < min(MAX_LIMIT, j - i):
+                    best = self._refill(child, i, j)
+                candidates.extend(best)
+                if len(best) < j - i:
+                    size = min(size, len(best))
+            i = j
+
+        best = self.top[prefix] = heapq.nsmallest(size, candidates)
+        return best
+
+    def _update_top(self, key: str, old: Optional[Rank], new: Optional[Rank]) -> None:
+        """Поправка посчитанных префиксов ключа после изменения его рейтинга"""
+        short = []
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            best = self.top.get(prefix)
+            if best is None:
+                continue
+            if old is not None and old in best:
+                best.remove(old)
+            # Если ключ не лучше последнего, список остаётся точным, но может стать короче
+            if new is not None and best and new < best[-1]:
+                best.insert(bisect_left(best, new), new)
+                del best[TOP_SIZE:]
+            if len(best) < MAX_LIMIT:
+                short.append(prefix)
+
+        # Запас кончился: пересборка от длинных префиксов к коротким,
+        # чтобы родители сливали уже пересобранные списки детей
+        for prefix in reversed(short):
+            start, end = self._range(prefix)
+            if end - start > self.heavy_threshold:
+                self._refill(prefix, start, end)
+            else:
+                del self.top[prefix]  # префикс стал лёгким, запрос просмотрит его целиком
+
+    def add(self, value: str) -> None:
+        key = self.key(value)
+        if not key:
+            return
+        i, found = self._find(key)
+        if found:
+            old = self._rank(i)
+            self.counts[i] += 1
+        else:
+            if len(self.texts) >= self.max_keys:
+                self.dropped += 1
+                return
+            old = None
+            text = value[:self.max_key_length]
+            self.texts.insert(i, text)
+            self.counts.insert(i, 1)
+            self._string_bytes += sys.getsizeof(text)
+        self._update_top(key, old, self._rank(i))
+
+    def remove(self, value: str) -> None:
+        key = self.key(value)
+        i, found = self._find(key)
+        if not found:
+            return
+        old = self._rank(i)
+        if self.counts[i] > 1:
+            self.counts[i] -= 1
+            self._update_top(key, old, self._rank(i))
+            return
+        self._string_bytes -= sys.getsizeof(self.texts[i])
+        del self.texts[i]
+        del self.counts[i]
+        self._update_top(key, old, None)
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Лучшие limit дополнений префикса"""
+        prefix = self.key(prefix)
+        if not prefix:
+            return []
+
+        start, end = self._range(prefix)
+        if end - start <= self.heavy_threshold:
+            best = self._best(start, end)
+        else:
+            best = self.top.get(prefix)
+            # Префикс стал тяжёлым после вставок: слияние детей, без просмотра диапазона
+            if best is None:
+                best = self._refill(prefix, start, end)
+
+        return [(text, -count) for count, _, text in best[:limit]]
+
+    def memory_bytes(self) -> int:
+        """Приблизительный размер индекса: массивы, строки и посчитанные префиксы"""
+        rank_size = sys.getsizeof((0, 0, ""))
+        top_bytes = sys.getsizeof(self.top) + sum(
+            sys.getsizeof(prefix) + sys.getsizeof(best) + len(best) * rank_size
+            for prefix, best in self.top.items()
+        )
+        return (sys.getsizeof(self.texts) + self._string_bytes
+                + self.counts.buffer_info()[1] * self.counts.itemsize + top_bytes)
+
+
+class AutocompleteIndex:
+    """
+    Индексы названий и авторов. У каждого поля своя блокировка, а запись держит её
+    на время вставки в массив (O(n) сдвиг), поэтому методы вызываются только
+    из синхронных обработчиков (пул потоков), не из event loop.
+
+    Индекс меняется только записями журнала books_log, которые пишут триггеры БД:
+    version - id последней применённой записи. sync() вызывают обработчики записи
+    после commit и фоновый поток по таймеру, поэтому изменения, сделанные через
+    другие воркеры, тоже попадают в индекс. До первой полной загрузки (ready)
+    sync() ничего не делает: всё записанное до снимка уже войдёт в него
+    """
+
+    def __init__(self, max_keys: int = 1_000_000, max_key_length: int = 128,
+                 heavy_threshold: int = 256) -> None:
+        self._settings = (max_keys, max_key_length, heavy_threshold)
+        self._indexes = {kind: PrefixIndex(*self._settings) for kind in KINDS}
+        self._locks = {kind: threading.Lock() for kind in KINDS}
+        self._sync_lock = threading.Lock()  # один sync/load за раз
+        self.version = 0
+        self.ready = threading.Event()
+
+    def build(self, books: Iterable[Tuple[str, str]], version: int = 0) -> None:
+        """
+        Построение по парам (title, author) за один проход: строки не копируются
+        целиком, лимит max_keys применяется уже при чтении. Новые массивы
+        собираются без блокировок и подменяют старые одним присваиванием
+        """
+        fresh = {kind: PrefixIndex(*self._settings) for kind in KINDS}
+        entries: Dict[str, Dict[str, List]] = {kind: {} for kind in KINDS}
+        dropped = dict.fromkeys(KINDS, 0)
+
+        for book in books:
+            for kind, value in zip(KINDS, book):
+                if not fresh[kind].collect(entries[kind], value):
+                    dropped[kind] += 1
+
+        for kind in KINDS:
+            fresh[kind].load(entries[kind], dropped[kind])
+            with self._locks[kind]:
+                self._indexes[kind] = fresh[kind]
+        self.version = version
+
+    def add(self, title: str, author: str) -> None:
+        for kind, value in zip(KINDS, (title, author)):
+            with self._locks[kind]:
+                self._indexes[kind].add(value)
+
+    def remove(self, title: str, author: str) -> None:
+        for kind, value in zip(KINDS, (title, author)):
+            with self._locks[kind]:
+                self._indexes[kind].remove(value)
+
+    def load(self, engine: Engine) -> None:
+        """Полная перестройка по согласованному снимку: таблица books и конец журнала"""
+        with engine.connect() as conn, self._sync_lock:
+            self._load(conn)
+
+    def _load(self, conn: Connection) -> None:
+        with _snapshot(conn):
+            version = conn.execute(select(func.max(BookChange.id))).scalar() or 0
+            rows = conn.execution_options(yield_per=10_000).execute(
+                select(Book.title, Book.author)
+            )
+            self.build(rows, version)
+        self.ready.set()
+
+    def sync(self, engine: Engine, conn: Optional[Connection] = None) -> int:
+        """
+        Применение новых записей журнала, возвращает их количество.
+        Обработчики записи передают conn своей сессии: пока они держат его,
+        второе соединение из пула может не найтись. Фоновый поток (без conn)
+        берёт соединение до блокировки и при отставании перестраивает индекс
+        """
+        if not self.ready.is_set():
+            return 0
+        if conn is not None:
+            with self._sync_lock:
+                return self._apply_log(conn, reload=False)
+        with engine.connect() as own, self._sync_lock:
+            return self._apply_log(own, reload=True)
+
+    def _apply_log(self, conn: Connection, reload: bool) -> int:
+        oldest = conn.execute(select(func.min(BookChange.id))).scalar()
+        changes = conn.execute(
+            select(BookChange.id, BookChange.old_title, BookChange.old_author,
+                   BookChange.new_title, BookChange.new_author)
+            .where(BookChange.id > self.version)
+            .order_by(BookChange.id)
+        ).all()
+
+        # Нужные записи уже удалены из журнала (воркер долго отставал):
+        # перестройку оставляем фоновому потоку, а не запросу
+        if oldest is not None and oldest > self.version + 1:
+            if not reload:
+                return 0
+            conn.rollback()
+            self._load(conn)
+            return len(changes)
+
+        for change_id, old_title, old_author, new_title, new_author in changes:
+            if old_title is not None:
+                self.remove(old_title, old_author)
+            if new_title is not None:
+                self.add(new_title, new_author)
+            self.version = change_id
+        return len(changes)
+
+    def prune(self, engine: Engine, keep: int = LOG_KEEP) -> None:
+        """Удаление из журнала записей старше последних keep, применённых этим воркером"""
+        if self.version > keep:
+            with engine.begin() as conn:
+                conn.execute(delete(BookChange).where(BookChange.id <= self.version - keep))
+
+    def run_sync(self, engine: Engine, interval: float, stop: threading.Event) -> None:
+        """
+        Цикл фонового потока: полная загрузка, если индекс ещё не построен,
+        затем синхронизация и чистка журнала каждые interval секунд
+        """
+        while not self.ready.is_set():
+            try:
+                self.load(engine)
+            except Exception:
+                logger.exception("Autocomplete load failed")
+                if stop.wait(interval):
+                    return
+
+        while not stop.wait(interval):
+            try:
+                self.sync(engine)
+                self.prune(engine)
+            except Exception:
+                logger.exception("Autocomplete sync failed")
+
+    def complete(self, prefix: str, limit: int = 10,
+                 kind: Optional[str] = None) -> List[Dict]:
+        """Дополнения по обоим полям (или одному kind), общий рейтинг по количеству книг"""
+        kinds = KINDS if kind is None else (kind,)
+        results = []
+        for name in kinds:
+            with self._locks[name]:
+                completions = self._indexes[name].complete(prefix, limit)
+            for text, count in completions:
+                results.append({"text": text, "kind": name, "count": count})
+
+        results.sort(key=lambda item: (-item["count"], len(item["text"]), item["text"]))
+        return results[:limit]
+
+    def stats(self) -> Dict:
+        stats = {}
+        for kind in KINDS:
+            with self._locks[kind]:
+                index = self._indexes[kind]
+                stats[kind] = {
+                    "keys": len(index.texts),
+                    "max_keys": index.max_keys,
+                    "dropped": index.dropped,
+                    "heavy_prefixes": len(index.top),
+                    "memory_bytes": index.memory_bytes(),
+                }
+        stats["version"] = self.version
+        return stats
+
+
+@contextmanager
+def _snapshot(conn: Connection) -> Iterator[None]:
+    """Чтение в одной транзакции: все запросы видят одно состояние БД"""
+    if conn.dialect.name == "sqlite":
+        # pysqlite не открывает транзакцию для SELECT, открываем её сами
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN")
+        try:
+            yield
+        finally:
+            conn.exec_driver_sql("COMMIT")
+    else:
+        conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            yield
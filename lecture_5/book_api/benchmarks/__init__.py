@@ -0,0 +1,7 @@
+"""
+Бенчмарки Book API. Запускаются из каталога lecture_5/book_api:
+
+    python -m benchmarks.startup       # холодный старт
+    python -m benchmarks.autocomplete  # индекс автодополнения
+    python -m benchmarks.load run      # нагрузка на эндпоинты
+"""
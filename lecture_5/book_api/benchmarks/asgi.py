@@ -0,0 +1,82 @@
+"""
+Минимальный in-process клиент для ASGI-приложения без сети и сторонних зависимостей
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Optional, Tuple
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Запуск startup/shutdown приложения так же, как это делает сервер"""
+    to_app: asyncio.Queue = asyncio.Queue()
+    from_app: asyncio.Queue = asyncio.Queue()
+
+    async def send(message):
+        await from_app.put(message)
+
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}},
+                                   to_app.get, send))
+
+    await to_app.put({"type": "lifespan.startup"})
+    message = await from_app.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {message.get('message')}")
+
+    try:
+        yield
+    finally:
+        await to_app.put({"type": "lifespan.shutdown"})
+        await from_app.get()
+        await task
+
+
+async def request(app, method: str, path: str, query: str = "",
+                  payload: Optional[Any] = None) -> Tuple[int, bytes]:
+    """Один HTTP-запрос к приложению, возвращает (статус, тело ответа)"""
+    body = json.dumps(payload).encode() if payload is not None else b""
+    headers = [(b"host", b"benchmark")]
+    if payload is not None:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+
+    received = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # тело уже отдано, ждём отмены
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
@@ -0,0 +1,173 @@
+"""
+Бенчмарк индекса автодополнения на синтетическом каталоге:
+время построения, размер индекса и задержки p50/p95/p99 запросов и обновлений.
+
+Запросы меряются трижды: на свежем индексе; вперемешку с обновлениями,
+часть которых удаляет лучшие дополнения коротких префиксов, чтобы в замер
+попали пересборки посчитанных списков; и при отдельном потоке записи,
+который работает одновременно с запросами, как обработчики create/update/delete
+в пуле потоков - здесь видно ожидание блокировок индекса и GIL
+
+Запуск из каталога lecture_5/book_api:
+
+    python -m benchmarks.autocomplete --books 1000000 --queries 100000
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import argparse
+import json
+import random
+import resource
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from autocomplete import MAX_LIMIT, AutocompleteIndex
+
+WORDS = (
+    "the of and a in to war peace night day house river city king queen "
+    "secret garden last first dark light lost island star shadow ghost "
+    "winter summer road home stone fire water iron glass silver golden "
+    "dream storm heart wolf dragon sea forest empire letters murder love "
+    "time machine journey world children memory blood song crown tower"
+).split()
+
+FIRST_NAMES = "anna boris daria ivan maria oleg pavel sofia viktor elena john jane".split()
+LAST_NAMES = "ivanov petrova smith brown tolstoy orwell austen kafka mann woolf".split()
+
+
+def generate_books(count: int, seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    books = []
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+        # Номер тома делает большинство названий уникальными, как в реальном каталоге
+        if rng.random() < 0.8:
+            title = f"{title} {i}"
+        author = f"{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()} {rng.randint(1, 5000)}"
+        books.append((title, author))
+    return books
+
+
+def percentiles(samples_ns: List[int]) -> Dict[str, float]:
+    samples = sorted(samples_ns)
+
+    def at(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))] / 1000, 2)
+
+    return {"p50_us": at(0.50), "p95_us": at(0.95), "p99_us": at(0.99),
+            "max_us": round(samples[-1] / 1000, 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Autocomplete index benchmark")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=10_000,
+                        help="обновлений во втором проходе, вперемешку с запросами")
+    parser.add_argument("--limit", type=int, default=MAX_LIMIT)
+    parser.add_argument("--writes-per-second", type=float, default=200,
+                        help="темп потока записи в третьем проходе")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    books = generate_books(args.books, args.seed)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    index = AutocompleteIndex(max_keys=max(args.books, 1))
+    started = time.perf_counter()
+    index.build(books)
+    build_s = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Префиксы длиной 1-8 символов, как при наборе в поле поиска
+    rng = random.Random(args.seed + 1)
+    prefixes = []
+    for _ in range(args.queries):
+        text = rng.choice(books)[rng.random() < 0.3]
+        prefixes.append(text[:rng.randint(1, 8)])
+
+    query_ns = []
+    for prefix in prefixes:
+        started = time.perf_counter_ns()
+        index.complete(prefix, args.limit)
+        query_ns.append(time.perf_counter_ns() - started)
+
+    # Второй проход: на каждое обновление queries / updates запросов.
+    # Каждое четвёртое обновление удаляет лучшее название и лучшего автора
+    # случайного короткого префикса - худший случай для посчитанных списков
+    mixed_ns = []
+    update_ns = []
+    every = max(1, args.queries // max(args.updates, 1))
+    for i, prefix in enumerate(prefixes):
+        if i % every == 0 and len(update_ns) < args.updates:
+            title, author = rng.choice(books)
+            copies = 1
+            if len(update_ns) % 4 == 0:
+                short = prefix[:rng.randint(1, 2)]
+                top_titles = index.complete(short, 1, "title")
+                top_authors = index.complete(short, 1, "author")
+                if top_titles and top_authors:
+                    title, author = top_titles[0]["text"], top_authors[0]["text"]
+                    copies = max(top_titles[0]["count"], top_authors[0]["count"])
+            started = time.perf_counter_ns()
+            for _ in range(copies):  # лишние удаления отсутствующего ключа ничего не делают
+                index.remove(title, author)
+            index.add(f"{title} revised {i}", author)
+            update_ns.append(time.perf_counter_ns() - started)
+
+        started = time.perf_counter_ns()
+        index.complete(prefix, args.limit)
+        mixed_ns.append(time.perf_counter_ns() - started)
+
+    # Третий проход: поток записи обновляет индекс в заданном темпе,
+    # пока основной поток выполняет те же запросы
+    stop = threading.Event()
+    writer_ns = []
+
+    def writer() -> None:
+        writer_rng = random.Random(args.seed + 2)
+        pause = 1 / args.writes_per_second
+        while not stop.is_set():
+            title, author = writer_rng.choice(books)
+            started = time.perf_counter_ns()
+            index.remove(title, author)
+            index.add(f"{title} concurrent {len(writer_ns)}", author)
+            writer_ns.append(time.perf_counter_ns() - started)
+            time.sleep(pause)
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    concurrent_ns = []
+    for prefix in prefixes:
+        started = time.perf_counter_ns()
+        index.complete(prefix, args.limit)
+        concurrent_ns.append(time.perf_counter_ns() - started)
+    stop.set()
+    writer_thread.join()
+
+    report = {
+        "books": args.books,
+        "build_s": round(build_s, 3),
+        "index": index.stats(),
+        "peak_rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+        "query": percentiles(query_ns),
+        "query_with_updates": percentiles(mixed_ns),
+        "update": percentiles(update_ns),
+        "query_with_concurrent_writer": percentiles(concurrent_ns),
+        "concurrent_writer": {"writes": len(writer_ns), **percentiles(writer_ns)},
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+Нагрузочный бенчмарк Book API
+
+Таблица books заполняется синтетическими книгами нужного размера, затем каждый
+сценарий (отдельный эндпоинт или смешанная нагрузка) запускается в свежем
+процессе: приложение вызывается in-process через ASGI несколькими
+конкурентными клиентами. В отчёт (JSON) попадают пропускная способность,
+задержки p50/p95/p99 по каждому эндпоинту и пиковый RSS процесса сценария.
+Прогрев (--warmup) идёт отдельной фазой и в замер не входит.
+Для сценария delete таблица заполняется с запасом на warmup + requests
+удалений, чтобы каждый запрос удалял одну из исходных книг.
+
+Запуск из каталога lecture_5/book_api:
+
+    python -m benchmarks.load run --books 1000,10000 --clients 8 --output new.json
+    python -m benchmarks.load compare base.json new.json --threshold 10
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.autocomplete import LAST_NAMES, WORDS, generate_books
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = ("list", "search_title", "search_author", "search_year",
+             "create", "update", "delete")
+
+# Смешанная нагрузка по умолчанию: в основном чтение, как в UI каталога
+DEFAULT_MIX = "list=10,search_title=30,search_author=20,search_year=15,create=10,update=10,delete=5"
+
+# Метрики, у которых рост значения - это ухудшение
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"Bad mix entry: {part!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+def seed_database(path: str, books: int, seed: int) -> None:
+    """Создание схемы миграциями и заполнение таблицы books"""
+    from sqlalchemy import create_engine, insert
+
+    from database import Book
+    from migrations import upgrade
+
+    engine = create_engine(f"sqlite:///{path}")
+    upgrade(engine)
+
+    rng = random.Random(seed)
+    rows = [
+        {"title": title, "author": author, "year": rng.randint(1900, 2024)}
+        for title, author in generate_books(books, seed)
+    ]
+    with engine.begin() as conn:
+        for start in range(0, len(rows), 10_000):
+            conn.execute(insert(Book), rows[start:start + 10_000])
+    engine.dispose()
+
+
+def percentile(samples: List[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int],
+              elapsed: float) -> Dict[str, Dict]:
+    summary = {}
+    for name, samples in latencies.items():
+        samples.sort()
+        summary[name] = {
+            "requests": len(samples),
+            "errors": errors.get(name, 0),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 0.50), 3),
+            "p95_ms": round(percentile(samples, 0.95), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+        }
+    return summary
+
+
+class Workload:
+    """Генератор запросов одного сценария и общий пул существующих id книг"""
+
+    def __init__(self, mix: Dict[str, int], books: int, seed: int) -> None:
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.ids = list(range(1, books + 1))
+        self.new_books = generate_books(1_000, seed + 1)
+        self.seed = seed
+
+    def next_request(
+            self, rng: random.Random
+    ) -> Tuple[str, str, str, str, Optional[Dict], Optional[int]]:
+        """
+        (эндпоинт, метод, путь, query string, тело, id книги). Книга update/delete
+        забирается из пула, чтобы одновременный delete не удалил её посреди
+        update; после update клиент возвращает id через release()
+        """
+        name = rng.choices(self.names, self.weights)[0]
+        if name in ("update", "delete") and not self.ids:
+            raise RuntimeError(
+                f"No books left for {name}: increase --books or reduce the share "
+                f"of deletes in --mix / --requests"
+            )
+
+        if name == "list":
+            return name, "GET", "/books/", "", None, None
+        if name == "search_title":
+            return name, "GET", "/books/search/", f"title={rng.choice(WORDS)}", None, None
+        if name == "search_author":
+            return name, "GET", "/books/search/", f"author={rng.choice(LAST_NAMES)}", None, None
+        if name == "search_year":
+            return name, "GET", "/books/search/", f"year={rng.randint(1900, 2024)}", None, None
+
+        title, author = rng.choice(self.new_books)
+        payload = {"title": title, "author": author, "year": rng.randint(1900, 2024)}
+        if name == "create":
+            return name, "POST", "/books/", "", payload, None
+
+        book_id = self.ids.pop(rng.randrange(len(self.ids)))
+        if name == "update":
+            return name, "PUT", f"/books/{book_id}", "", payload, book_id
+        return name, "DELETE", f"/books/{book_id}", "", None, book_id
+
+    def release(self, name: str, book_id: Optional[int], status: int, body: bytes) -> None:
+        """Возврат id в пул после запроса: обновлённая или созданная книга"""
+        if name == "update":
+            self.ids.append(book_id)
+        elif name == "create" and status == 200:
+            self.ids.append(json.loads(body)["id"])
+
+
+async def drive(app, workload: Workload, clients: int, requests: int,
+                warmup: int) -> Dict[str, Dict]:
+    """
+    Конкурентные клиенты делят общий счётчик запросов. Прогрев - отдельная
+    фаза до замера: его запросы не попадают ни в задержки, ни во время
+    """
+    from benchmarks.asgi import request
+
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    rngs = [random.Random(workload.seed * 1000 + number) for number in range(clients)]
+
+    async def phase(count: int, measured: bool) -> None:
+        remaining = count
+
+        async def client(rng: random.Random) -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                name, method, path, query, payload, book_id = workload.next_request(rng)
+
+                started = time.perf_counter()
+                status, body = await request(app, method, path, query, payload)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+                workload.release(name, book_id, status, body)
+                if not measured:
+                    continue
+                latencies.setdefault(name, []).append(elapsed_ms)
+                if status != 200:
+                    errors[name] = errors.get(name, 0) + 1
+
+        await asyncio.gather(*(client(rng) for rng in rngs))
+
+    await phase(warmup, measured=False)
+    started = time.perf_counter()
+    await phase(requests, measured=True)
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_scenario(mix: Dict[str, int], books: int, clients: int,
+                       requests: int, warmup: int, seed: int) -> Dict:
+    import main
+    from benchmarks.asgi import lifespan
+
+    async with lifespan(main.app):
+        # Индекс автодополнения строится в фоне: замер начинается после загрузки
+        if main.autocomplete_index is not None:
+            await asyncio.to_thread(main.autocomplete_index.ready.wait)
+        startup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        endpoints = await drive(main.app, Workload(mix, books, seed),
+                                clients, requests, warmup)
+
+    return {
+        "endpoints": endpoints,
+        "startup_rss_mb": round(startup_rss / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def spawn_scenario(db_path: str, scenario: str, mix: str, books: int, args) -> Dict:
+    """Сценарий в отдельном процессе, чтобы пиковый RSS относился только к нему"""
+    env = dict(os.environ)
+    env["BOOK_API_DATABASE_URL"] = f"sqlite:///{db_path}"
+    env["BOOK_API_SKIP_MIGRATIONS"] = "1"
+
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.load", "_scenario",
+         "--mix", mix, "--books", str(books), "--clients", str(args.clients),
+         "--requests", str(args.requests), "--warmup", str(args.warmup),
+         "--seed", str(args.seed)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Scenario {scenario} failed:\n{result.stderr}")
+    return json.loads(result.stdout)
+
+
+def command_run(args) -> None:
+    sizes = [int(size) for size in args.books.split(",")]
+    scenarios = {name: f"{name}=1" for name in ENDPOINTS}
+    scenarios["mixed"] = args.mix
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "clients": args.clients,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "mix": args.mix,
+        },
+        "runs": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            seeded = os.path.join(tmp, f"seed_{size}.db")
+            seed_database(seeded, size, args.seed)
+
+            results = {}
+            for scenario, mix in scenarios.items():
+                # Каждый сценарий работает на своей копии, записи не влияют на соседей
+                db_path = os.path.join(tmp, f"{scenario}_{size}.db")
+                books = size
+                if scenario == "delete":
+                    # К концу сценария в таблице остаётся size книг
+                    books = size + args.warmup + args.requests
+                    seed_database(db_path, books, args.seed)
+                else:
+                    shutil.copy(seeded, db_path)
+                results[scenario] = spawn_scenario(db_path, scenario, mix, books, args)
+                results[scenario]["seeded_books"] = books
+                print(f"books={size} {scenario}: done", file=sys.stderr)
+            report["runs"][str(size)] = results
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+
+def compare_reports(base: Dict, new: Dict, threshold: float) -> List[Dict]:
+    """Все метрики, ухудшившиеся больше чем на threshold процентов"""
+    regressions = []
+
+    def check(where: str, metric: str, old: float, value: float) -> None:
+        if not old:
+            return
+        change = (value - old) / old * 100
+        worse = change if metric in LOWER_IS_BETTER else -change
+        if worse > threshold:
+            regressions.append({"where": where, "metric": metric, "base": old,
+                                "new": value, "change_pct": round(change, 1)})
+
+    for size, scenarios in new["runs"].items():
+        for scenario, result in scenarios.items():
+            old_result = base["runs"].get(size, {}).get(scenario)
+            if old_result is None:
+                continue
+            where = f"books={size} {scenario}"
+            check(where, "peak_rss_mb", old_result["peak_rss_mb"], result["peak_rss_mb"])
+            for endpoint, stats in result["endpoints"].items():
+                old_stats = old_result["endpoints"].get(endpoint)
+                if old_stats is None:
+                    continue
+                for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                    if metric in stats:
+                        check(f"{where} {endpoint}", metric, old_stats[metric], stats[metric])
+
+    return regressions
+
+
+def command_compare(args) -> None:
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    regressions = compare_reports(base, new, args.threshold)
+
+    for item in regressions:
+        print(f"REGRESSION {item['where']} {item['metric']}: "
+              f"{item['base']} -> {item['new']} ({item['change_pct']:+}%)")
+    if not regressions:
+        print(f"No regressions above {args.threshold}%")
+    sys.exit(1 if regressions else 0)
+
+
+def command_scenario(args) -> None:
+    result = asyncio.run(run_scenario(parse_mix(args.mix), args.books, args.clients,
+                                      args.requests, args.warmup, args.seed))
+    print(json.dumps(result))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Book API load benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="заполнить БД и прогнать все сценарии")
+    run.add_argument("--books", default="1000,10000", help="размеры каталога через запятую")
+    run.add_argument("--clients", type=int, default=8, help="число конкурентных клиентов")
+    run.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    run.add_argument("--warmup", type=int, default=100, help="неизмеряемых запросов в начале")
+    run.add_argument("--mix", default=DEFAULT_MIX, help="веса смешанной нагрузки")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    run.set_defaults(handler=command_run)
+
+    compare = commands.add_parser("compare", help="сравнить два отчёта")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="допустимое ухудшение в процентах")
+    compare.set_defaults(handler=command_compare)
+
+    # Внутренняя команда: один сценарий в дочернем процессе
+    scenario = commands.add_parser("_scenario")
+    scenario.add_argument("--mix", required=True)
+    scenario.add_argument("--books", type=int, required=True)
+    scenario.add_argument("--clients", type=int, required=True)
+    scenario.add_argument("--requests", type=int, required=True)
+    scenario.add_argument("--warmup", type=int, required=True)
+    scenario.add_argument("--seed", type=int, required=True)
+    scenario.set_defaults(handler=command_scenario)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        try:
+            parse_mix(args.mix)
+        except argparse.ArgumentTypeError as error:
+            parser.error(str(error))
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Бенчмарк холодного старта Book API:
+1. Время импорта main.py по данным `python -X importtime`
+2. Время до первого ответа в свежем процессе (импорт + lifespan + первый запрос)
+   на пустой БД и на БД, заполненной --books книгами
+3. Время от конца импорта до готовности индекса автодополнения, который
+   строится в фоне после старта
+
+Запуск из каталога lecture_5/book_api:
+
+    python -m benchmarks.startup --runs 10 --books 100000 --output startup.json
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Код, выполняемый в дочернем процессе: замеряет этапы старта изнутри
+FIRST_REQUEST_SCRIPT = """
+import asyncio, json, time
+t0 = time.perf_counter()
+import main
+from benchmarks.asgi import lifespan, request
+t1 = time.perf_counter()
+
+async def run():
+    async with lifespan(main.app):
+        t2 = time.perf_counter()
+        status, _ = await request(main.app, "GET", "/")
+        t3 = time.perf_counter()
+        # Индекс автодополнения строится в фоне после старта
+        if main.autocomplete_index is not None:
+            await asyncio.to_thread(main.autocomplete_index.ready.wait)
+        t4 = time.perf_counter()
+    return t2, t3, t4, status
+
+t2, t3, t4, status = asyncio.run(run())
+print(json.dumps({
+    "status": status,
+    "import_ms": (t1 - t0) * 1000,
+    "lifespan_ms": (t2 - t1) * 1000,
+    "first_request_ms": (t3 - t2) * 1000,
+    "autocomplete_ready_ms": (t4 - t1) * 1000,
+}))
+"""
+
+
+def _env(db_path: str, skip_migrations: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["BOOK_API_DATABASE_URL"] = f"sqlite:///{db_path}"
+    if skip_migrations:
+        env["BOOK_API_SKIP_MIGRATIONS"] = "1"
+    return env
+
+
+def seed_books(db_path: str, books: int) -> None:
+    """Заполнение уже мигрированной БД книгами (без приложения, через sqlite3)"""
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO books (title, author, year) VALUES (?, ?, ?)",
+            ((f"Book title {i}", f"Author {i % 5000}", 1900 + i % 125) for i in range(books)),
+        )
+
+
+def measure_import_time(db_path: str, top: int) -> Dict:
+    """Разбор вывода -X importtime: общее время импорта main и самые тяжёлые модули"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=APP_DIR, env=_env(db_path, True),
+        capture_output=True, text=True, check=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+
+    main_entry = next(m for m in modules if m["module"] == "main")
+    heaviest = sorted(modules, key=lambda m: m["cumulative_ms"], reverse=True)
+
+    return {
+        "main_cumulative_ms": main_entry["cumulative_ms"],
+        "modules_imported": len(modules),
+        "heaviest": [m for m in heaviest if m["module"] != "main"][:top],
+    }
+
+
+def measure_first_request(db_path: str, skip_migrations: bool) -> Dict:
+    """Один свежий процесс: от запуска интерпретатора до первого ответа"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT],
+        cwd=APP_DIR, env=_env(db_path, skip_migrations),
+        capture_output=True, text=True, check=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    if run["status"] != 200:
+        raise RuntimeError(f"First request failed with status {run['status']}")
+    run["process_wall_ms"] = round(wall_ms, 3)
+    return run
+
+
+def _summary(runs: List[Dict]) -> Dict:
+    keys = ["import_ms", "lifespan_ms", "first_request_ms", "autocomplete_ready_ms",
+            "process_wall_ms"]
+    return {
+        key: {
+            "median": round(statistics.median(run[key] for run in runs), 3),
+            "min": round(min(run[key] for run in runs), 3),
+            "max": round(max(run[key] for run in runs), 3),
+        }
+        for key in keys
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Book API cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="число свежих процессов")
+    parser.add_argument("--top", type=int, default=15, help="сколько модулей показать")
+    parser.add_argument("--books", type=int, default=100_000,
+                        help="размер заполненной БД для замера старта")
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Холодная БД: каждый процесс сам применяет миграции в lifespan
+        cold = []
+        for i in range(args.runs):
+            cold.append(measure_first_request(os.path.join(tmp, f"cold_{i}.db"), False))
+
+        # Схема уже применена (`python migrations.py`), воркеры пропускают миграции
+        warm_db = os.path.join(tmp, "warm.db")
+        measure_first_request(warm_db, False)
+        warm = [measure_first_request(warm_db, True) for _ in range(args.runs)]
+
+        # Та же схема с данными: фоновая загрузка индекса видна в autocomplete_ready_ms
+        seeded_db = os.path.join(tmp, "seeded.db")
+        measure_first_request(seeded_db, False)
+        seed_books(seeded_db, args.books)
+        seeded = [measure_first_request(seeded_db, True) for _ in range(args.runs)]
+
+        report = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "import_time": measure_import_time(warm_db, args.top),
+            "first_request_with_migrations": _summary(cold),
+            "first_request_migrated_db": _summary(warm),
+            "seeded_books": args.books,
+            "first_request_seeded_db": _summary(seeded),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,25 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import os
 
-# 1. URL подключения к БД
-DATABASE_URL = "sqlite:///./book.db"
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.orm import declarative_base, sessionmaker
 
-# 2. Создаю движок
+# 1. URL подключения к БД (можно переопределить переменной окружения)
+DATABASE_URL = os.environ.get("BOOK_API_DATABASE_URL", "sqlite:///./book.db")
+
+# 2. Создаю движок (подключение к БД откроется только при первом запросе)
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 )
 
+# Для SQLite включаю WAL: долгое чтение снимка (построение индекса
+# автодополнения) не блокирует запись других воркеров
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_wal(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
 # 3. Фабрика сессий
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -33,7 +41,19 @@ class Book(Base):
     year = Column(Integer, nullable=True)
 
 
-# 6. Функция для получения сессии БД
+# 6. Журнал изменений книг, заполняется триггерами (миграция 2)
+class BookChange(Base):
+    __tablename__ = "books_log"
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, nullable=False)
+    old_title = Column(String, nullable=True)   # None для добавления
+    old_author = Column(String, nullable=True)
+    new_title = Column(String, nullable=True)   # None для удаления
+    new_author = Column(String, nullable=True)
+
+
+# 7. Функция для получения сессии БД
 def get_db():
     db = SessionLocal()
     try:
@@ -3,16 +3,39 @@
 
 Автор: [Владислав Мещеряк]
 Версия: 1.0
+
+Схема БД при импорте не создаётся: миграции (migrations.py) применяются
+в lifespan при старте. Рекомендуется выполнять их шагом деплоя командой
+`python migrations.py` и запускать воркеры с BOOK_API_SKIP_MIGRATIONS=1.
+FastAPI, Pydantic и SQLAlchemy по-прежнему импортируются сразу (на них
+объявлены модели и маршруты); autocomplete.py и migrations.py импортируются
+в lifespan и только когда нужны.
+
+Индекс автодополнения (autocomplete.py) строится из таблицы books в фоновом
+потоке после старта: полное чтение таблицы (~0.7 с на 100 тыс. книг, ~15 с
+на 1 млн) не задерживает lifespan, а /books/autocomplete до конца загрузки
+отвечает 503. BOOK_API_AUTOCOMPLETE=0 отключает индекс вместе с импортом модуля.
+Индекс догоняет БД по журналу books_log после каждой записи и в фоновом потоке
+раз в BOOK_API_AUTOCOMPLETE_SYNC_SECONDS секунд (изменения других воркеров).
 """
 
-from fastapi import FastAPI, Depends, HTTPException
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Literal, TYPE_CHECKING
+
+from database import get_db, Book, engine
 
-from database import get_db, Book, Base, engine
+if TYPE_CHECKING:
+    from autocomplete import AutocompleteIndex
 
-Base.metadata.create_all(engine)
+# Максимальный limit автодополнения, равен autocomplete.MAX_LIMIT
+# (модуль при импорте main не загружается)
+AUTOCOMPLETE_MAX_LIMIT = 20
 
 class BookCreate(BaseModel):
     title: str
@@ -25,8 +48,49 @@ class BookResponse(BookCreate):
     class Config:
         from_attributes = True
 
+class Completion(BaseModel):
+    text: str
+    kind: str
+    count: int
+
+# Индекс автодополнения, создаётся в lifespan. None, если автодополнение отключено
+autocomplete_index: Optional["AutocompleteIndex"] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global autocomplete_index
+
+    # Воркерам с BOOK_API_SKIP_MIGRATIONS=1 модуль миграций не нужен
+    if os.environ.get("BOOK_API_SKIP_MIGRATIONS") != "1":
+        from migrations import upgrade
+        upgrade(engine)
+
+    if os.environ.get("BOOK_API_AUTOCOMPLETE") == "0":
+        autocomplete_index = None
+        yield
+        return
+
+    from autocomplete import AutocompleteIndex
+
+    # Размер индекса ограничен числом уникальных ключей на поле
+    autocomplete_index = AutocompleteIndex(
+        max_keys=int(os.environ.get("BOOK_API_AUTOCOMPLETE_MAX_KEYS", 1_000_000))
+    )
+
+    # Поток сначала строит индекс, затем синхронизирует его с журналом
+    stop = threading.Event()
+    sync_thread = threading.Thread(
+        target=autocomplete_index.run_sync,
+        args=(engine, float(os.environ.get("BOOK_API_AUTOCOMPLETE_SYNC_SECONDS", 2)), stop),
+        daemon=True,
+    )
+    sync_thread.start()
+    yield
+    stop.set()
+    sync_thread.join()
+
 # Инициализация приложения
-app = FastAPI(title="Book API", version = "1.0.0")
+app = FastAPI(title="Book API", version = "1.0.0", lifespan=lifespan)
 
 # Корень программы
 @app.get("/")
@@ -60,6 +124,36 @@ def search_books(
     books = query.all()
     return books
 
+# Применение к индексу автодополнения изменений из журнала (включая только что
+# записанные): старые значения берутся из журнала, а не из прочитанной строки,
+# поэтому одновременные изменения одной книги не рассинхронизируют индекс.
+# Журнал читается через соединение сессии, второе из пула не занимается
+def sync_autocomplete(db: Session) -> None:
+    if autocomplete_index is not None:
+        autocomplete_index.sync(engine, db.connection())
+
+def get_autocomplete_index() -> "AutocompleteIndex":
+    if autocomplete_index is None:
+        raise HTTPException(status_code=404, detail="Autocomplete is disabled")
+    if not autocomplete_index.ready.is_set():
+        raise HTTPException(status_code=503, detail="Autocomplete index is loading")
+    return autocomplete_index
+
+# Автодополнение названий и авторов из индекса в памяти.
+# Обычный def: индекс под блокировкой, ждать её можно только в пуле потоков
+@app.get("/books/autocomplete", response_model=List[Completion])
+def autocomplete(
+        q: str,
+        limit: int = Query(10, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+        kind: Optional[Literal["title", "author"]] = None,
+        index=Depends(get_autocomplete_index)):
+    return index.complete(q, limit, kind)
+
+# Размер индекса автодополнения
+@app.get("/books/autocomplete/stats")
+def autocomplete_stats(index=Depends(get_autocomplete_index)):
+    return index.stats()
+
 # Добавление книги
 @app.post("/books/", response_model=BookResponse)
 def create_book(book: BookCreate, db: Session = Depends(get_db)):
@@ -67,6 +161,7 @@ def create_book(book: BookCreate, db: Session = Depends(get_db)):
     db.add(db_book)
     db.commit()
     db.refresh(db_book)
+    sync_autocomplete(db)
     return db_book
 
 # Обновление книги по ID
@@ -86,6 +181,8 @@ def update_book(book_id: int, book_update: BookCreate, db: Session = Depends(get
     db.commit()
     db.refresh(db_book)
 
+    sync_autocomplete(db)
+
     return db_book
 
 # Удаление книги по ID
@@ -98,5 +195,6 @@ def delete_book(book_id: int, db: Session = Depends(get_db)):
 
     db.delete(book)
     db.commit()
+    sync_autocomplete(db)
 
     return {"message": f"Book {book_id} deleted"}
\ No newline at end of file
@@ -0,0 +1,182 @@
+"""
+Версионированные миграции схемы БД для Book API
+
+Схема не создаётся при импорте main.py. Рекомендуемый способ - применить
+миграции один раз шагом деплоя, до запуска воркеров:
+
+    python migrations.py
+
+и запускать воркеры с BOOK_API_SKIP_MIGRATIONS=1. Без этой переменной
+каждый воркер вызывает upgrade() в lifespan; одновременный запуск безопасен,
+так как миграции выполняются под блокировкой записи в одной транзакции.
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+# Ключ advisory-блокировки PostgreSQL для миграций
+LOCK_KEY = 5_0201
+
+# Ключ advisory-блокировки PostgreSQL для записей в books_log (см. миграцию 2)
+LOG_LOCK_KEY = 5_0202
+
+# Служебная таблица: по строке на каждую применённую миграцию
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+)
+
+
+# 1. Миграция 1: таблица книг.
+# Таблица описана здесь, а не взята из database.Book, чтобы миграция
+# не менялась вместе с моделью
+def _create_books(conn: Connection) -> None:
+    books = Table(
+        "books", MetaData(),
+        Column("id", Integer, primary_key=True, index=True),
+        Column("title", String, nullable=False),
+        Column("author", String, nullable=False),
+        Column("year", Integer, nullable=True),
+    )
+    books.create(conn, checkfirst=True)
+
+
+# 2. Миграция 2: журнал изменений книг для синхронизации индексов автодополнения
+# между воркерами. Журнал пишут триггеры, поэтому старые значения в нём
+# точные даже при одновременных изменениях одной книги из разных процессов
+_SQLITE_LOG_TRIGGERS = [
+    """
+    CREATE TRIGGER books_log_insert AFTER INSERT ON books BEGIN
+        INSERT INTO books_log (book_id, new_title, new_author)
+        VALUES (NEW.id, NEW.title, NEW.author);
+    END
+    """,
+    """
+    CREATE TRIGGER books_log_update AFTER UPDATE OF title, author ON books
+    WHEN OLD.title IS NOT NEW.title OR OLD.author IS NOT NEW.author BEGIN
+        INSERT INTO books_log (book_id, old_title, old_author, new_title, new_author)
+        VALUES (NEW.id, OLD.title, OLD.author, NEW.title, NEW.author);
+    END
+    """,
+    """
+    CREATE TRIGGER books_log_delete AFTER DELETE ON books BEGIN
+        INSERT INTO books_log (book_id, old_title, old_author)
+        VALUES (OLD.id, OLD.title, OLD.author);
+    END
+    """,
+]
+
+# В PostgreSQL транзакции могут фиксироваться не в порядке id журнала,
+# поэтому запись в журнал сериализуется advisory-блокировкой до конца транзакции
+_POSTGRESQL_LOG_TRIGGERS = [
+    f"""
+    CREATE FUNCTION books_log_write() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock({LOG_LOCK_KEY});
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO books_log (book_id, new_title, new_author)
+            VALUES (NEW.id, NEW.title, NEW.author);
+        ELSIF TG_OP = 'UPDATE' THEN
+            IF OLD.title IS DISTINCT FROM NEW.title OR OLD.author IS DISTINCT FROM NEW.author THEN
+                INSERT INTO books_log (book_id, old_title, old_author, new_title, new_author)
+                VALUES (NEW.id, OLD.title, OLD.author, NEW.title, NEW.author);
+            END IF;
+        ELSE
+            INSERT INTO books_log (book_id, old_title, old_author)
+            VALUES (OLD.id, OLD.title, OLD.author);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER books_log_write AFTER INSERT OR UPDATE OR DELETE ON books
+    FOR EACH ROW EXECUTE FUNCTION books_log_write()
+    """,
+]
+
+
+def _create_books_log(conn: Connection) -> None:
+    books_log = Table(
+        "books_log", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("book_id", Integer, nullable=False),
+        Column("old_title", String, nullable=True),
+        Column("old_author", String, nullable=True),
+        Column("new_title", String, nullable=True),
+        Column("new_author", String, nullable=True),
+    )
+    books_log.create(conn)
+
+    triggers = {
+        "sqlite": _SQLITE_LOG_TRIGGERS,
+        "postgresql": _POSTGRESQL_LOG_TRIGGERS,
+    }.get(conn.dialect.name)
+    if triggers is None:
+        raise RuntimeError(f"books_log triggers are not implemented for {conn.dialect.name}")
+    for statement in triggers:
+        conn.exec_driver_sql(statement)
+
+
+# 3. Список миграций: (версия, описание, функция). Новые добавлять только в конец
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create books table", _create_books),
+    (2, "create books_log table and triggers", _create_books_log),
+]
+
+
+def current_version(conn: Connection) -> int:
+    """Текущая версия схемы (0 для пустой БД)"""
+    schema_version.create(conn, checkfirst=True)
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def _apply(conn: Connection) -> int:
+    version = current_version(conn)
+
+    for number, _, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        migrate(conn)
+        conn.execute(insert(schema_version).values(version=number))
+        version = number
+
+    return version
+
+
+def upgrade(engine: Engine) -> int:
+    """
+    Применение всех ещё не применённых миграций, возвращает итоговую версию.
+    Всё выполняется в одной транзакции под блокировкой записи: второй воркер
+    ждёт первого и затем видит уже обновлённую версию
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            # pysqlite сам открывает транзакции и выполняет DDL вне их,
+            # поэтому транзакцией управляем вручную. BEGIN IMMEDIATE сразу
+            # берёт блокировку записи на всю БД
+            conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                version = _apply(conn)
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+            conn.exec_driver_sql("COMMIT")
+            return version
+
+        with conn.begin():
+            if engine.dialect.name == "postgresql":
+                conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({LOCK_KEY})")
+            return _apply(conn)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    print(f"Schema version: {upgrade(engine)}")
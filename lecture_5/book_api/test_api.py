@@ -0,0 +1,183 @@
+"""
+Проверка связки обработчиков create/update/delete с индексом автодополнения.
+
+Запуск из каталога lecture_5/book_api: python -m pytest test_api.py
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+import main
+from autocomplete import MAX_LIMIT, AutocompleteIndex
+from database import get_db
+
+
+@pytest.fixture
+def test_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'book.db'}",
+                           connect_args={"check_same_thread": False})
+    monkeypatch.setenv("BOOK_API_AUTOCOMPLETE_SYNC_SECONDS", "0.05")
+    monkeypatch.delenv("BOOK_API_SKIP_MIGRATIONS", raising=False)
+    monkeypatch.delenv("BOOK_API_AUTOCOMPLETE", raising=False)
+    use_engine(engine, monkeypatch)
+    yield engine
+    main.app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def use_engine(engine, monkeypatch):
+    """Приложение и сессии get_db работают с engine"""
+    monkeypatch.setattr(main, "engine", engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[get_db] = override_get_db
+
+
+@contextmanager
+def start(app):
+    """Клиент, дождавшийся фоновой загрузки индекса"""
+    with TestClient(app) as client:
+        assert main.autocomplete_index.ready.wait(5)
+        yield client
+
+
+def complete(client, q, **params):
+    response = client.get("/books/autocomplete", params={"q": q, **params})
+    assert response.status_code == 200
+    return [(item["text"], item["kind"], item["count"]) for item in response.json()]
+
+
+def test_write_handlers_update_index(test_engine):
+    with start(main.app) as client:
+        client.post("/books/", json={"title": "Harry Potter", "author": "Rowling"})
+        client.post("/books/", json={"title": "Harry Potter", "author": "Hardy"})
+        client.post("/books/", json={"title": "Hamlet", "author": "Shakespeare"})
+
+        # Названия и авторы в одном рейтинге
+        assert complete(client, "ha") == [
+            ("Harry Potter", "title", 2), ("Hardy", "author", 1), ("Hamlet", "title", 1),
+        ]
+
+        client.put("/books/1", json={"title": "Hamlet", "author": "Rowling"})
+        assert complete(client, "ha", kind="title") == [
+            ("Hamlet", "title", 2), ("Harry Potter", "title", 1),
+        ]
+
+        client.delete("/books/2")
+        assert complete(client, "ha") == [("Hamlet", "title", 2)]
+
+
+def test_concurrent_updates_keep_index_in_sync(test_engine, monkeypatch):
+    with start(main.app) as client:
+        client.post("/books/", json={"title": "Original", "author": "Author"})
+
+        # Оба обработчика прочитали "Original" и ждут друг друга перед commit
+        barrier = threading.Barrier(2, timeout=5)
+        commit = Session.commit
+
+        def commit_after_barrier(self):
+            barrier.wait()
+            commit(self)
+
+        statuses = []
+
+        def update(title):
+            response = client.put("/books/1", json={"title": title, "author": "Author"})
+            statuses.append(response.status_code)
+
+        monkeypatch.setattr(Session, "commit", commit_after_barrier)
+        threads = [threading.Thread(target=update, args=(title,)) for title in ("Alpha", "Beta")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        monkeypatch.setattr(Session, "commit", commit)
+        assert statuses == [200, 200]
+
+        title = client.get("/books/").json()[0]["title"]
+        assert complete(client, title[0], kind="title") == [(title, "title", 1)]
+        for other in ("Original", "Alpha", "Beta"):
+            if other != title:
+                assert complete(client, other, kind="title") == []
+
+
+def test_write_handlers_sync_through_session_connection(test_engine, monkeypatch):
+    # Пул из одного соединения: обработчик держит его в сессии, и sync,
+    # который ждёт второе соединение из пула, здесь упёрся бы в таймаут
+    engine = create_engine(test_engine.url, connect_args={"check_same_thread": False},
+                           pool_size=1, max_overflow=0, pool_timeout=2)
+    use_engine(engine, monkeypatch)
+    with start(main.app) as client:
+        assert client.post("/books/", json={"title": "Dune", "author": "Herbert"}).status_code == 200
+        assert client.put("/books/1", json={"title": "Emma", "author": "Austen"}).status_code == 200
+        assert complete(client, "e") == [("Emma", "title", 1)]
+        assert client.delete("/books/1").status_code == 200
+        assert complete(client, "e") == []
+    engine.dispose()
+
+
+def test_index_picks_up_writes_from_other_workers(test_engine):
+    with start(main.app) as client:
+        client.post("/books/", json={"title": "Dune", "author": "Herbert"})
+
+        # Запись мимо этого процесса, как из другого воркера
+        with test_engine.begin() as conn:
+            conn.execute(text("INSERT INTO books (title, author) VALUES ('Dracula', 'Stoker')"))
+            conn.execute(text("DELETE FROM books WHERE title = 'Dune'"))
+
+        deadline = time.monotonic() + 5
+        while complete(client, "d") != [("Dracula", "title", 1)]:
+            assert time.monotonic() < deadline, complete(client, "d")
+            time.sleep(0.05)
+
+
+def test_disabled_autocomplete_returns_404(test_engine, monkeypatch):
+    monkeypatch.setenv("BOOK_API_AUTOCOMPLETE", "0")
+    with TestClient(main.app) as client:
+        assert client.post("/books/", json={"title": "Dune", "author": "Herbert"}).status_code == 200
+        assert client.get("/books/autocomplete", params={"q": "d"}).status_code == 404
+        assert client.get("/books/autocomplete/stats").status_code == 404
+
+
+def test_index_loads_in_background(test_engine, monkeypatch):
+    loading = threading.Event()
+    load = AutocompleteIndex.load
+
+    def slow_load(self, engine):
+        loading.wait(5)
+        load(self, engine)
+
+    monkeypatch.setattr(AutocompleteIndex, "load", slow_load)
+    with TestClient(main.app) as client:
+        # Старт не ждёт индекс: книги доступны, автодополнение - ещё нет
+        assert client.post("/books/", json={"title": "Dune", "author": "Herbert"}).status_code == 200
+        assert client.get("/books/autocomplete", params={"q": "d"}).status_code == 503
+
+        loading.set()
+        assert main.autocomplete_index.ready.wait(5)
+        assert complete(client, "d") == [("Dune", "title", 1)]
+
+
+def test_main_does_not_import_autocomplete():
+    code = "import sys, main; print('autocomplete' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+    assert main.AUTOCOMPLETE_MAX_LIMIT == MAX_LIMIT
@@ -0,0 +1,119 @@
+"""
+Проверка индекса автодополнения против полного перебора после
+последовательностей добавлений, удалений и обновлений.
+
+Запуск из каталога lecture_5/book_api: python -m pytest test_autocomplete.py
+
+Автор: [Владислав Мещеряк]
+Версия: 1.0
+"""
+
+import itertools
+import random
+from typing import Dict, List, Tuple
+
+from autocomplete import MAX_LIMIT, PrefixIndex
+
+ALPHABET = "ab c"
+
+
+class Reference:
+    """Та же семантика, что у PrefixIndex, но без индексов: перебор всех ключей"""
+
+    def __init__(self, index: PrefixIndex) -> None:
+        self.key = index.key
+        self.entries: Dict[str, List] = {}  # ключ -> [текст, количество]
+
+    def add(self, value: str) -> None:
+        key = self.key(value)
+        if key:
+            self.entries.setdefault(key, [value, 0])[1] += 1
+
+    def remove(self, value: str) -> None:
+        entry = self.entries.get(self.key(value))
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.entries[self.key(value)]
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        prefix = self.key(prefix)
+        if not prefix:
+            return []
+        ranks = sorted((-count, len(text), text) for key, (text, count) in self.entries.items()
+                       if key.startswith(prefix))
+        return [(text, -count) for count, _, text in ranks[:limit]]
+
+
+def make_index(values: List[str]) -> Tuple[PrefixIndex, Reference]:
+    # Низкий порог, чтобы на маленьком словаре были тяжёлые префиксы и их пересборка
+    index = PrefixIndex(max_keys=10_000, max_key_length=128, heavy_threshold=8)
+    reference = Reference(index)
+    entries: Dict[str, List] = {}
+    for value in values:
+        index.collect(entries, value)
+        reference.add(value)
+    index.load(entries, 0)
+    return index, reference
+
+
+def random_value(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 6))).strip() or "a"
+
+
+def assert_same(index: PrefixIndex, reference: Reference) -> None:
+    for length in (1, 2, 3):
+        for prefix in itertools.product(ALPHABET.replace(" ", ""), repeat=length):
+            prefix = "".join(prefix)
+            for limit in (1, 7, MAX_LIMIT):
+                assert index.complete(prefix, limit) == reference.complete(prefix, limit), prefix
+
+
+def test_matches_reference_after_updates():
+    rng = random.Random(2024)
+    values = [random_value(rng) for _ in range(2_000)]
+    index, reference = make_index(values)
+    assert index.top, "в тесте должны быть посчитанные тяжёлые префиксы"
+    assert_same(index, reference)
+
+    for step in range(3_000):
+        operation = rng.random()
+        if operation < 0.35:
+            value = random_value(rng)
+            index.add(value)
+            reference.add(value)
+            values.append(value)
+        elif operation < 0.7:
+            # Удаление в другом регистре: ключ нормализуется
+            value = values.pop(rng.randrange(len(values))).upper()
+            index.remove(value)
+            reference.remove(value)
+        else:
+            # Обновление, как в update_book: удалить старое значение, добавить новое
+            position = rng.randrange(len(values))
+            new_value = random_value(rng)
+            index.remove(values[position])
+            reference.remove(values[position])
+            index.add(new_value)
+            reference.add(new_value)
+            values[position] = new_value
+        if step % 100 == 0:
+            assert_same(index, reference)
+
+    assert_same(index, reference)
+
+
+def test_removing_top_keys_refills_without_query():
+    values = [f"a{i:03d}" for i in range(300)] + ["a000"] * 5 + ["a001"] * 4
+    index, reference = make_index(values)
+
+    # Удаляем лучшие ключи префикса "a", пока не кончится запас списка
+    for text, count in reference.complete("a", MAX_LIMIT * 3):
+        for _ in range(count):
+            index.remove(text)
+            reference.remove(text)
+
+    # Список пересобран при удалениях, запрос не пересчитывает его
+    assert len(index.top["a"]) >= MAX_LIMIT
+    assert_same(index, reference)